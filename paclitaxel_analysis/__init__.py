@@ -6,5 +6,7 @@ from .data_processor import DataProcessor
 from .model import DoseResponseModel
 from .visualizer import Visualizer
 from .reporter import Reporter
+from .scheduler import StageScheduler
+from .result_store import ResultStore
 
-__all__ = ['DataProcessor', 'DoseResponseModel', 'Visualizer', 'Reporter'] 
\ No newline at end of file
+__all__ = ['DataProcessor', 'DoseResponseModel', 'Visualizer', 'Reporter', 'StageScheduler', 'ResultStore'] 
\ No newline at end of file
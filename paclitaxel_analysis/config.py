@@ -50,4 +50,6 @@ DOSE_RESPONSE_PLOT = 'paclitaxel_dose_response_curves.png'
 FEATURE_IMPORTANCE_PLOT = 'feature_importance.png'
 OPTIMAL_DOSES_CSV = 'paclitaxel_optimal_doses.csv'
 IC50_RESULTS_CSV = 'paclitaxel_ic50_results.csv'
-TOXICITY_INDEX_CSV = 'paclitaxel_toxicity_index.csv' 
\ No newline at end of file
+TOXICITY_INDEX_CSV = 'paclitaxel_toxicity_index.csv'
+RESPONSE_METRICS_CSV = 'paclitaxel_response_metrics.csv'
+RESULTS_DB = 'paclitaxel_results.db' 
\ No newline at end of file
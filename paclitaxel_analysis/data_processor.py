@@ -7,12 +7,18 @@ import numpy as np
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from scipy import stats
 from scipy.optimize import curve_fit
+import time
 
 class DataProcessor:
-    def __init__(self):
+    def __init__(self, result_store=None):
         self.label_encoder = LabelEncoder()
         self.scaler = StandardScaler()
         self.df = None
+        self.drug_name = None
+        self.result_store = result_store
+        self.response_metrics = None
+        self.ic50_tier_summary = None
+        self.ic50_phase_seconds = None
         
     def load_data(self, file_path='Book1 (1).xlsx'):
         """Excel dosyasından veri yükle"""
@@ -25,12 +31,17 @@ class DataProcessor:
         print(self.df.head())
         return self
         
-    def preprocess(self, drug_name='PACLITAXEL'):
-        """Veriyi ön işle"""
+    def preprocess(self, drug_name='PACLITAXEL', run_analyses=True):
+        """
+        Veriyi ön işle
+        run_analyses: False ise IC50 ve toksisite hesapları atlanır
+        (aşama zamanlayıcısı bunları ayrı süreçlerde çalıştırır)
+        """
         if self.df is None:
             raise ValueError("Veri yüklenmedi. Önce load_data() çağırın.")
             
         # Sadece belirtilen ilacı filtrele
+        self.drug_name = drug_name
         self.df = self.df[self.df['DRUG_NAME'] == drug_name].copy()
         print(f"\n{drug_name} verisi filtrelendi: {len(self.df)} satır")
         
@@ -47,6 +58,9 @@ class DataProcessor:
         self.df = self.df.dropna(subset=['dose', 'viability'])
         print(f"Geçersiz değerler temizlendi: {len(self.df)} satır kaldı")
         
+        # Ölçeklenmemiş dozu metrikler için sakla
+        self.df['raw_dose'] = self.df['dose']
+        
         # Özellik mühendisliği
         self.df['log_dose'] = np.log10(self.df['dose'] + 1e-10)  # Log dönüşümü
         
@@ -62,11 +76,12 @@ class DataProcessor:
         print(f"- Doz aralığı: {self.df['dose'].min():.4f} - {self.df['dose'].max():.4f}")
         print(f"- Canlılık aralığı: {self.df['viability'].min():.3f} - {self.df['viability'].max():.3f}")
         
-        # IC50 hesapla
-        self.calculate_ic50()
-        
-        # Toksisite indeksi hesapla
-        self.calculate_toxicity_index()
+        if run_analyses:
+            # IC50 hesapla
+            self.calculate_ic50()
+            
+            # Toksisite indeksi hesapla
+            self.calculate_toxicity_index()
         
         return self
         
@@ -74,60 +89,241 @@ class DataProcessor:
         """4-parametreli sigmoid fonksiyonu (Hill denklemi)"""
         return bottom + (top - bottom) / (1 + (x / ic50) ** hill_slope)
         
-    def calculate_ic50(self):
-        """Her hücre hattı için IC50 hesapla"""
-        ic50_results = []
+    def _group_dose_response(self):
+        """
+        Veriyi hücre hattı ve doza göre sırala, tekrarları ortala
+        Tüm hatlar için gruplanmış NumPy indirgemelerinde kullanılan dizileri döndürür
+        """
+        codes = self.df['cell_line_encoded'].to_numpy()
+        doses = self.df['raw_dose'].to_numpy(dtype=float)
+        viability = self.df['viability'].to_numpy(dtype=float)
+        n_lines = len(self.label_encoder.classes_)
+        
+        order = np.lexsort((doses, codes))
+        codes, doses, viability = codes[order], doses[order], viability[order]
+        
+        is_new = np.ones(len(codes), dtype=bool)
+        is_new[1:] = (codes[1:] != codes[:-1]) | (doses[1:] != doses[:-1])
+        starts = np.flatnonzero(is_new)
+        n_replicates = np.diff(np.append(starts, len(codes)))
+        
+        pair_codes = codes[starts]
+        
+        # Her hücre hattının sıralı (hat, doz) dizisindeki sınırları
+        n_doses = np.bincount(pair_codes, minlength=n_lines)
+        line_end = np.cumsum(n_doses)
+        line_start = line_end - n_doses
+        
+        # Ham ölçümlerin hat sınırları (tam 4PL fit için)
+        n_measurements = np.bincount(codes, minlength=n_lines)
+        raw_end = np.cumsum(n_measurements)
+        
+        return {
+            'n_lines': n_lines,
+            'codes': codes,
+            'doses': doses,
+            'viability': viability,
+            'n_measurements': n_measurements,
+            'raw_start': raw_end - n_measurements,
+            'raw_end': raw_end,
+            'pair_codes': pair_codes,
+            'pair_doses': doses[starts],
+            'pair_viability': np.add.reduceat(viability, starts) / n_replicates if len(starts) else viability,
+            'pair_log': np.log10(doses[starts] + 1e-10),
+            'n_doses': n_doses,
+            'first': np.minimum(line_start, len(pair_codes) - 1),
+            'last': np.maximum(line_end - 1, 0)
+        }
+        
+    def screen_ic50(self, grouped, min_response_range=0.2, min_doses=4, min_shortcut_r2=0.9,
+                    max_shortcut_ratio=1.5):
+        """
+        IC50 için 1. kademe: tüm hatlar için vektörel tarama
+        - 0.5 kesişiminden interpolasyonlu IC50, monotonluk ve yanıt aralığı kontrolü
+        - Log-logit doğrusal regresyonu ile kapalı formda 4PL kestirimi (kısayol)
+        Kısayol yalnızca %50'yi temiz kesen ve kestirimi interpolasyonlu IC50 ile
+        max_shortcut_ratio kat içinde uyuşan hatlara uygulanır.
+        Her hat için kademe: 'skipped' (fit edilemez), 'shortcut' (fit gerekmez), 'fit' (belirsiz)
+        """
+        n_lines = grouped['n_lines']
+        pair_codes = grouped['pair_codes']
+        pair_viability = grouped['pair_viability']
+        pair_log = grouped['pair_log']
+        n_doses = grouped['n_doses']
+        first, last = grouped['first'], grouped['last']
+        has_data = n_doses > 0
+        
+        same_line = pair_codes[1:] == pair_codes[:-1]
+        segment_codes = pair_codes[:-1]
+        dv = np.diff(pair_viability)
+        
+        # Yanıt aralığı ve monotonluk (0.1'den büyük artış = monoton değil)
+        line_starts = np.flatnonzero(np.r_[True, ~same_line]) if len(pair_codes) else np.array([], dtype=int)
+        response_range = np.zeros(n_lines)
+        if len(line_starts):
+            response_range[pair_codes[line_starts]] = (
+                np.maximum.reduceat(pair_viability, line_starts) - np.minimum.reduceat(pair_viability, line_starts)
+            )
+        n_increases = np.bincount(segment_codes, weights=(dv > 0.1) & same_line, minlength=n_lines)
+        monotone = n_increases == 0
+        
+        # 0.5 canlılığın ilk kesişimi (log-doz üzerinde doğrusal interpolasyon)
+        ic50_interpolated = np.full(n_lines, np.nan)
+        crossing = np.flatnonzero(same_line & (pair_viability[:-1] >= 0.5) & (pair_viability[1:] < 0.5))
+        if len(crossing):
+            crossing_lines, first_crossing = np.unique(pair_codes[crossing], return_index=True)
+            i = crossing[first_crossing]
+            t = (pair_viability[i] - 0.5) / (pair_viability[i] - pair_viability[i + 1])
+            ic50_interpolated[crossing_lines] = 10 ** (pair_log[i] + t * (pair_log[i + 1] - pair_log[i]))
+        
+        # Plato kestirimleri curve_fit sınırları içinde
+        top = np.clip(np.where(has_data, pair_viability[first], np.nan), 0.5, 1.5)
+        bottom = np.clip(np.where(has_data, pair_viability[last], np.nan), 0.0, 0.5)
+        
+        # log10((top - v) / (v - bottom)) = h * log10(x) - h * log10(ic50)
+        pair_top, pair_bottom = top[pair_codes], bottom[pair_codes]
+        valid = (pair_viability > pair_bottom + 0.02) & (pair_viability < pair_top - 0.02)
+        z = np.log10(
+            np.divide(pair_top - pair_viability, pair_viability - pair_bottom,
+                      out=np.ones_like(pair_viability), where=valid)
+        )
+        w = valid.astype(float)
+        n = np.bincount(pair_codes, weights=w, minlength=n_lines)
+        sx = np.bincount(pair_codes, weights=w * pair_log, minlength=n_lines)
+        sy = np.bincount(pair_codes, weights=w * z, minlength=n_lines)
+        sxx = np.bincount(pair_codes, weights=w * pair_log ** 2, minlength=n_lines)
+        sxy = np.bincount(pair_codes, weights=w * pair_log * z, minlength=n_lines)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hill = (n * sxy - sx * sy) / (n * sxx - sx ** 2)
+            intercept = (sy - hill * sx) / n
+            ic50 = 10 ** (-intercept / hill)
+        
+        # Kısayol eğrisinin ham ölçümler üzerindeki R² değeri
+        codes, doses, viability = grouped['codes'], grouped['doses'], grouped['viability']
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            predicted = self.sigmoid_4pl(doses, top[codes], bottom[codes], ic50[codes], hill[codes])
+            n_measurements = np.maximum(grouped['n_measurements'], 1)
+            mean_viability = np.bincount(codes, weights=viability, minlength=n_lines) / n_measurements
+            ss_res = np.bincount(codes, weights=(viability - predicted) ** 2, minlength=n_lines)
+            ss_tot = np.bincount(codes, weights=(viability - mean_viability[codes]) ** 2, minlength=n_lines)
+            r_squared = 1 - ss_res / ss_tot
+        
+        min_dose = grouped['pair_doses'][first]
+        max_dose = grouped['pair_doses'][last]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ic50_ratio = ic50 / ic50_interpolated
+        shortcut_ok = (
+            monotone & (n >= 3) & np.isfinite(ic50) & np.isfinite(r_squared)
+            & (hill >= 0.1) & (hill <= 10.0) & (ic50 >= min_dose) & (ic50 <= max_dose)
+            & (r_squared >= min_shortcut_r2)
+            # Veri %50'yi kesmeli ve kestirim interpolasyonla uyuşmalı
+            & np.isfinite(ic50_interpolated)
+            & (ic50_ratio <= max_shortcut_ratio) & (ic50_ratio >= 1 / max_shortcut_ratio)
+        )
+        
+        tier = np.full(n_lines, 'fit', dtype=object)
+        tier[shortcut_ok] = 'shortcut'
+        tier[~has_data | (n_doses < min_doses) | (response_range < min_response_range)] = 'skipped'
+        
+        return pd.DataFrame({
+            'Cell_Line': self.label_encoder.classes_,
+            'Fit_Tier': tier,
+            'IC50_Interpolated_µM': ic50_interpolated,
+            'Response_Range': response_range,
+            'Monotone': monotone,
+            'IC50_µM': ic50,
+            'R_squared': r_squared,
+            'Hill_Slope': hill,
+            'Top_Plateau': top,
+            'Bottom_Plateau': bottom
+        })
+        
+    def calculate_ic50(self, maxfev=1000):
+        """
+        Her hücre hattı için IC50 hesapla (iki kademeli)
+        1. kademe: vektörel tarama ve kısayol kestirimi (screen_ic50)
+        2. kademe: yalnızca belirsiz hatlar için tohumlanmış tam 4PL fit
+        """
+        fit_columns = ['IC50_µM', 'R_squared', 'Hill_Slope', 'Top_Plateau', 'Bottom_Plateau']
+        
+        start = time.perf_counter()
+        grouped = self._group_dose_response()
+        ic50_df = self.screen_ic50(grouped)
+        ic50_df.loc[ic50_df['Fit_Tier'] == 'skipped', fit_columns] = np.nan
+        screen_time = time.perf_counter() - start
         
-        for cell_line in self.df['ARXSPAN_ID'].unique():
-            cell_data = self.df[self.df['ARXSPAN_ID'] == cell_line].copy()
-            cell_data = cell_data.sort_values('dose')
+        start = time.perf_counter()
+        for idx in np.flatnonzero(ic50_df['Fit_Tier'].to_numpy() == 'fit'):
+            row = ic50_df.iloc[idx]
+            cell_line = row['Cell_Line']
             
-            # Orijinal doz değerlerini kullan (ölçeklenmemiş)
-            doses_orig = pd.read_excel('Book1 (1).xlsx', sheet_name='DOZ X CANLILIK')
-            doses_orig = doses_orig[doses_orig['DRUG_NAME'] == 'PACLITAXEL']
-            doses_orig = doses_orig[doses_orig['ARXSPAN_ID'] == cell_line]
+            # Ham (ölçeklenmemiş) doz-canlılık noktaları
+            line_slice = slice(grouped['raw_start'][idx], grouped['raw_end'][idx])
+            x = grouped['doses'][line_slice]
+            y = grouped['viability'][line_slice]
             
-            x = doses_orig['dose'].values
-            y = cell_data['viability'].values
+            # Başlangıç değerlerini taramadan tohumla
+            ic50_seed = row['IC50_Interpolated_µM']
+            if not (min(x) <= ic50_seed <= max(x)):
+                ic50_seed = np.median(x)
+            hill_seed = row['Hill_Slope']
+            if not (0.1 <= hill_seed <= 10.0):
+                hill_seed = 1.0
             
             try:
                 # 4-parametreli sigmoid eğrisi fit et
                 popt, _ = curve_fit(
                     self.sigmoid_4pl,
                     x, y,
-                    p0=[1.0, 0.0, np.median(x), 1.0],  # top, bottom, ic50, hill_slope
+                    p0=[row['Top_Plateau'], row['Bottom_Plateau'], ic50_seed, hill_seed],  # top, bottom, ic50, hill_slope
                     bounds=([0.5, 0.0, min(x), 0.1], [1.5, 0.5, max(x), 10.0]),
-                    maxfev=5000
+                    maxfev=maxfev
                 )
                 
-                ic50 = popt[2]
-                r_squared = self.calculate_r_squared(y, self.sigmoid_4pl(x, *popt))
-                
-                ic50_results.append({
-                    'Cell_Line': cell_line,
-                    'IC50_µM': ic50,
-                    'R_squared': r_squared,
-                    'Hill_Slope': popt[3],
-                    'Top_Plateau': popt[0],
-                    'Bottom_Plateau': popt[1]
-                })
+                ic50_df.loc[idx, fit_columns] = [
+                    popt[2],
+                    self.calculate_r_squared(y, self.sigmoid_4pl(x, *popt)),
+                    popt[3],
+                    popt[0],
+                    popt[1]
+                ]
                 
             except Exception as e:
                 print(f"IC50 hesaplanamadı - {cell_line}: {str(e)}")
-                ic50_results.append({
-                    'Cell_Line': cell_line,
-                    'IC50_µM': np.nan,
-                    'R_squared': np.nan,
-                    'Hill_Slope': np.nan,
-                    'Top_Plateau': np.nan,
-                    'Bottom_Plateau': np.nan
-                })
+                ic50_df.loc[idx, 'Fit_Tier'] = 'failed'
+                ic50_df.loc[idx, fit_columns] = np.nan
+        fit_time = time.perf_counter() - start
+        
+        # Kademe başına sayımlar (kademeler ayrık, toplamı hat sayısına eşit)
+        tier_counts = ic50_df['Fit_Tier'].value_counts()
+        self.ic50_tier_summary = pd.DataFrame([
+            {'Tier': 'skipped', 'Phase': 'screen', 'Cell_Lines': tier_counts.get('skipped', 0)},
+            {'Tier': 'shortcut', 'Phase': 'screen', 'Cell_Lines': tier_counts.get('shortcut', 0)},
+            {'Tier': 'fit', 'Phase': 'curve_fit', 'Cell_Lines': tier_counts.get('fit', 0)},
+            {'Tier': 'failed', 'Phase': 'curve_fit', 'Cell_Lines': tier_counts.get('failed', 0)}
+        ])
+        
+        # Aşama süreleri: tarama tüm hatları kapsar, curve_fit yalnızca fit + failed hatları
+        self.ic50_phase_seconds = {
+            'screen_all_lines': screen_time,
+            'curve_fit': fit_time
+        }
         
         # IC50 sonuçlarını kaydet
-        ic50_df = pd.DataFrame(ic50_results)
+        ic50_df = ic50_df[['Cell_Line'] + fit_columns + ['IC50_Interpolated_µM', 'Fit_Tier']]
         ic50_df.to_csv('paclitaxel_ic50_results.csv', index=False)
+        if self.result_store is not None:
+            self.result_store.write_line_results('ic50', ic50_df, drug=self.drug_name)
         print(f"\nIC50 sonuçları kaydedildi: {len(ic50_df)} hücre hattı")
         print(f"Başarılı IC50 hesaplaması: {ic50_df['IC50_µM'].notna().sum()} hücre hattı")
+        print(f"- Tarama (vektörel, tüm {len(ic50_df)} hat): {screen_time:.3f} sn, "
+              f"kısayol: {tier_counts.get('shortcut', 0)}, atlanan: {tier_counts.get('skipped', 0)}")
+        print(f"- Tam 4PL fit: {fit_time:.3f} sn, "
+              f"{tier_counts.get('fit', 0) + tier_counts.get('failed', 0)} hücre hattı "
+              f"({tier_counts.get('failed', 0)} başarısız)")
+        
+        return ic50_df
         
     def calculate_r_squared(self, y_actual, y_pred):
         """R-kare hesapla"""
@@ -135,27 +331,88 @@ class DataProcessor:
         ss_tot = np.sum((y_actual - np.mean(y_actual)) ** 2)
         return 1 - (ss_res / ss_tot)
         
-    def calculate_toxicity_index(self):
-        """Toksisite indeksi hesapla"""
-        toxicity_results = []
+    def calculate_response_metrics(self, reference_doses=(0.001, 0.01, 0.1)):
+        """
+        Tüm hücre hatları için yanıt metriklerini gruplanmış NumPy indirgemeleriyle hesapla
+        - Log-doz üzerinde trapez AUC ve aktivite alanı (1 - canlılık altında kalan alan)
+        - Sabit referans dozlarda interpolasyonla canlılık
+        - En yüksek dozdaki canlılık ve toksisite indeksi
+        Tekrarlar (aynı doz) ortalanır; her hat farklı doz setine sahip olabilir.
+        """
+        grouped = self._group_dose_response()
+        n_lines = grouped['n_lines']
+        pair_codes = grouped['pair_codes']
+        pair_doses = grouped['pair_doses']
+        pair_viability = grouped['pair_viability']
+        pair_log = grouped['pair_log']
+        n_doses = grouped['n_doses']
+        first, last = grouped['first'], grouped['last']
         
-        for cell_line in self.df['ARXSPAN_ID'].unique():
-            cell_data = self.df[self.df['ARXSPAN_ID'] == cell_line]
-            
-            # En yüksek dozdaki ortalama canlılık
-            max_dose_viability = cell_data[cell_data['dose'] == cell_data['dose'].max()]['viability'].mean()
-            
-            # Toksisite indeksi (1 - canlılık)
-            toxicity_index = 1 - max_dose_viability
+        # Log-doz üzerinde trapez integrali (hat sınırını aşan segmentler sıfırlanır)
+        dx = np.diff(pair_log) * (pair_codes[1:] == pair_codes[:-1])
+        segment_codes = pair_codes[:-1]
+        inhibition = np.clip(1 - pair_viability, 0, None)
+        
+        auc = np.bincount(
+            segment_codes, weights=dx * (pair_viability[1:] + pair_viability[:-1]) / 2, minlength=n_lines
+        )
+        activity_area = np.bincount(
+            segment_codes, weights=dx * (inhibition[1:] + inhibition[:-1]) / 2, minlength=n_lines
+        )
+        log_span = np.bincount(segment_codes, weights=dx, minlength=n_lines)
+        auc_normalized = np.divide(auc, log_span, out=np.full(n_lines, np.nan), where=log_span > 0)
+        
+        metrics = {
+            'Cell_Line': self.label_encoder.classes_,
+            'N_Doses': n_doses,
+            'N_Measurements': grouped['n_measurements'],
+            'Min_Dose_µM': pair_doses[first],
+            'Max_Dose_µM': pair_doses[last],
+            'AUC_LogDose': auc,
+            'AUC_Normalized': auc_normalized,
+            'Activity_Area': activity_area
+        }
+        
+        # Referans dozlarda canlılık: hat + log-doz birleşik anahtarında ikili arama
+        if len(pair_log) > 0:
+            log_offset = pair_log.min()
+            key_width = pair_log.max() - log_offset + 1
+            keys = pair_codes * key_width + (pair_log - log_offset)
             
-            toxicity_results.append({
-                'Cell_Line': cell_line,
-                'Max_Dose_Viability': max_dose_viability,
-                'Toxicity_Index': toxicity_index
-            })
+            for ref_dose in reference_doses:
+                log_ref = np.log10(ref_dose + 1e-10)
+                query = np.arange(n_lines) * key_width + (log_ref - log_offset)
+                right = np.clip(np.searchsorted(keys, query), first + 1, last)
+                left = np.maximum(right - 1, first)
+                
+                x0, x1 = pair_log[left], pair_log[right]
+                t = np.divide(log_ref - x0, x1 - x0, out=np.zeros(n_lines), where=x1 > x0)
+                interpolated = pair_viability[left] + t * (pair_viability[right] - pair_viability[left])
+                
+                # Ölçülen doz aralığı dışında kalan hatlar için tahmin yapma
+                in_range = (n_doses > 0) & (log_ref >= pair_log[first]) & (log_ref <= pair_log[last])
+                metrics[f'Viability_at_{ref_dose:g}µM'] = np.where(in_range, interpolated, np.nan)
+        
+        # En yüksek dozdaki ortalama canlılık ve toksisite indeksi (1 - canlılık)
+        max_dose_viability = np.where(n_doses > 0, pair_viability[last], np.nan)
+        metrics['Max_Dose_Viability'] = max_dose_viability
+        metrics['Toxicity_Index'] = 1 - max_dose_viability
+        
+        self.response_metrics = pd.DataFrame(metrics)
+        return self.response_metrics
+        
+    def calculate_toxicity_index(self):
+        """Toksisite indeksi ve genişletilmiş yanıt metriklerini hesapla"""
+        metrics_df = self.calculate_response_metrics()
+        
+        # Yanıt metriklerini kaydet
+        metrics_df.to_csv('paclitaxel_response_metrics.csv', index=False)
+        if self.result_store is not None:
+            self.result_store.write_line_results('response', metrics_df, drug=self.drug_name)
+        print(f"Yanıt metrikleri kaydedildi: {len(metrics_df)} hücre hattı")
         
         # Toksisite sonuçlarını kaydet
-        toxicity_df = pd.DataFrame(toxicity_results)
+        toxicity_df = metrics_df[['Cell_Line', 'Max_Dose_Viability', 'Toxicity_Index']]
         toxicity_df.to_csv('paclitaxel_toxicity_index.csv', index=False)
         print(f"Toksisite indeksi kaydedildi: {len(toxicity_df)} hücre hattı")
         
@@ -170,6 +427,13 @@ class DataProcessor:
         
         return X, y
         
+    def get_groups(self):
+        """Grup bazlı cross-validation için satır başına hücre hattı kimliklerini döndür"""
+        if self.df is None:
+            raise ValueError("Veri işlenmedi. preprocess() çağırın.")
+            
+        return self.df['ARXSPAN_ID'].to_numpy()
+        
     def get_cell_lines(self):
         """Benzersiz hücre hatlarını döndür"""
         if self.df is None:
@@ -12,6 +12,70 @@ from data_processor import DataProcessor
 from model import DoseResponseModel  
 from visualizer import Visualizer
 from reporter import Reporter
+from scheduler import StageScheduler
+from result_store import ResultStore
+
+# Aşama fonksiyonları (ayrı süreçlerde çalıştırıldığı için modül düzeyinde)
+def run_ic50_stage(data_processor):
+    """IC50 hesaplama aşaması (sonuçlar, kademe özeti ve aşama süreleri)"""
+    ic50_df = data_processor.calculate_ic50()
+    return ic50_df, data_processor.ic50_tier_summary, data_processor.ic50_phase_seconds
+
+def run_toxicity_stage(data_processor):
+    """Toksisite ve yanıt metrikleri aşaması"""
+    data_processor.calculate_toxicity_index()
+    return data_processor.response_metrics
+
+def run_training_stage(data_processor, n_jobs):
+    """Model eğitimi aşaması"""
+    X, y = data_processor.get_features_target()
+    model = DoseResponseModel(result_store=data_processor.result_store)
+    model.train(X, y, n_jobs=n_jobs, groups=data_processor.get_groups())
+    return model
+
+def run_plotting_stage(data_processor, model):
+    """Görselleştirme aşaması (grafikler dosyaya kaydedilir)"""
+    import matplotlib
+    matplotlib.use('Agg')  # Alt süreçte pencere açılmaz
+    
+    model.build_fast_predictor(data_processor)
+    visualizer = Visualizer()
+    
+    # Doz-yanıt eğrileri (rastgele 15 hücre hattı)
+    visualizer.plot_dose_response_curves(data_processor, model, max_lines=15)
+    
+    # Özellik önem grafiği
+    visualizer.plot_feature_importance(model)
+
+def run_optimal_dose_stage(data_processor, max_cell_lines, model):
+    """Optimal doz hesaplama aşaması"""
+    cell_lines = data_processor.get_cell_lines()
+    
+    # İlk max_cell_lines hücre hattı için optimal doz hesapla
+    sample_cell_lines = cell_lines[:max_cell_lines] if len(cell_lines) > max_cell_lines else cell_lines
+    
+    print(f"   • {len(sample_cell_lines)} hücre hattı için optimal doz hesaplanacak...")
+    
+    optimal_doses = []
+    for i, cell_line in enumerate(sample_cell_lines):
+        try:
+            optimal_dose, ci_lower, ci_upper = model.find_optimal_dose(
+                data_processor, cell_line, target_viability=0.2
+            )
+            
+            if optimal_dose is not None:
+                optimal_doses.append((cell_line, optimal_dose, ci_lower, ci_upper))
+            
+            # İlerleme göstergesi
+            if (i + 1) % 10 == 0:
+                print(f"     ✓ {i + 1}/{len(sample_cell_lines)} hücre hattı tamamlandı")
+                
+        except Exception as e:
+            print(f"     ⚠️ {cell_line} için optimal doz hesaplanamadı: {str(e)}")
+            continue
+    
+    print(f"\n   ✅ {len(optimal_doses)}/{len(sample_cell_lines)} hücre hattı için başarılı hesaplama")
+    return optimal_doses
 
 def main():
     print("🧬 PACLİTAXEL DOZ OPTİMİZASYONU ANALİZİ BAŞLIYOR...")
@@ -20,15 +84,16 @@ def main():
     try:
         # Bileşenleri başlat
         print("\n1️⃣ Sistem bileşenleri başlatılıyor...")
-        data_processor = DataProcessor()
-        model = DoseResponseModel()
-        visualizer = Visualizer()
-        reporter = Reporter()
+        result_store = ResultStore('paclitaxel_results.db')
+        result_store.start_run('PACLITAXEL')
+        data_processor = DataProcessor(result_store=result_store)
+        reporter = Reporter(result_store=result_store)
+        scheduler = StageScheduler()
         
-        # Veri yükleme ve ön işleme
+        # Veri yükleme ve ön işleme (IC50 ve toksisite ayrı aşamalarda)
         print("\n2️⃣ Excel verisi yükleniyor ve işleniyor...")
         data_processor.load_data('Book1 (1).xlsx')
-        data_processor.preprocess('PACLITAXEL')  # Sadece Paclitaxel verisi
+        data_processor.preprocess('PACLITAXEL', run_analyses=False)  # Sadece Paclitaxel verisi
         
         # Özellik ve hedef değişkenleri al
         X, y = data_processor.get_features_target()
@@ -37,56 +102,36 @@ def main():
         print(f"   • Veri noktası sayısı: {X.shape[0]}")
         print(f"   • Hücre hattı sayısı: {len(data_processor.get_cell_lines())}")
         
-        # Model eğitimi
-        print("\n3️⃣ XGBoost modeli eğitiliyor...")
-        model.train(X, y)
+        # Bağımsız aşamaları eşzamanlı çalıştır:
+        # IC50 ve toksisite model eğitimiyle, grafikler optimal doz aramasıyla paralel
+        print(f"\n3️⃣ Analiz aşamaları çalıştırılıyor ({scheduler.max_cores} çekirdek)...")
+        train_cores = max(1, scheduler.max_cores - 2)
+        scheduler.add_stage('ic50', run_ic50_stage, args=(data_processor,))
+        scheduler.add_stage('toxicity', run_toxicity_stage, args=(data_processor,))
+        scheduler.add_stage('model', run_training_stage, args=(data_processor, train_cores), cores=train_cores)
+        scheduler.add_stage('plots', run_plotting_stage, args=(data_processor,), deps=('model',))
+        scheduler.add_stage('optimal_doses', run_optimal_dose_stage, args=(data_processor, 50), deps=('model',))
+        
+        stage_results = scheduler.run()
+        scheduler.export_timeline('pipeline_stage_timeline.csv')
+        
+        # Alt süreçlerdeki hesapların sonuçlarını ana nesneye geri aktar
+        _, data_processor.ic50_tier_summary, data_processor.ic50_phase_seconds = stage_results['ic50']
+        data_processor.response_metrics = stage_results['toxicity']
+        
+        model = stage_results['model']
+        model.build_fast_predictor(data_processor)
         
         # Model performansını değerlendir
         print("\n4️⃣ Model performansı değerlendiriliyor...")
         y_pred = model.predict(X)
         performance_metrics = reporter.calculate_model_performance(y, y_pred)
         
-        # Görselleştirmeler oluştur
-        print("\n5️⃣ Görselleştirmeler hazırlanıyor...")
-        
-        # Doz-yanıt eğrileri (rastgele 15 hücre hattı)
-        visualizer.plot_dose_response_curves(data_processor, model, max_lines=15)
-        
-        # Özellik önem grafiği
-        visualizer.plot_feature_importance(model)
-        
-        # Optimal doz hesaplama
-        print("\n6️⃣ Optimal dozlar hesaplanıyor...")
-        cell_lines = data_processor.get_cell_lines()
-        
-        # İlk 50 hücre hattı için optimal doz hesapla
-        sample_cell_lines = cell_lines[:50] if len(cell_lines) > 50 else cell_lines
-        
-        print(f"   • {len(sample_cell_lines)} hücre hattı için optimal doz hesaplanacak...")
-        
-        successful_calculations = 0
-        for i, cell_line in enumerate(sample_cell_lines):
-            try:
-                optimal_dose, ci_lower, ci_upper = model.find_optimal_dose(
-                    data_processor, cell_line, target_viability=0.2
-                )
-                
-                if optimal_dose is not None:
-                    reporter.add_optimal_dose(cell_line, optimal_dose, ci_lower, ci_upper)
-                    successful_calculations += 1
-                
-                # İlerleme göstergesi
-                if (i + 1) % 10 == 0:
-                    print(f"     ✓ {i + 1}/{len(sample_cell_lines)} hücre hattı tamamlandı")
-                    
-            except Exception as e:
-                print(f"     ⚠️ {cell_line} için optimal doz hesaplanamadı: {str(e)}")
-                continue
-        
-        print(f"\n   ✅ {successful_calculations}/{len(sample_cell_lines)} hücre hattı için başarılı hesaplama")
+        for cell_line, optimal_dose, ci_lower, ci_upper in stage_results['optimal_doses']:
+            reporter.add_optimal_dose(cell_line, optimal_dose, ci_lower, ci_upper)
         
         # Kapsamlı rapor oluştur
-        print("\n7️⃣ Kapsamlı analiz raporu hazırlanıyor...")
+        print("\n5️⃣ Kapsamlı analiz raporu hazırlanıyor...")
         results_df = reporter.generate_comprehensive_report()
         
         print("\n" + "=" * 60)
@@ -98,8 +143,11 @@ def main():
             "paclitaxel_optimal_doses.csv",
             "paclitaxel_ic50_results.csv",
             "paclitaxel_toxicity_index.csv", 
+            "paclitaxel_response_metrics.csv",
             "paclitaxel_dose_response_curves.png",
-            "feature_importance.png"
+            "feature_importance.png",
+            "pipeline_stage_timeline.csv",
+            "paclitaxel_results.db"
         ]
         
         for file in output_files:
@@ -109,7 +157,8 @@ def main():
             'model': model,
             'data_processor': data_processor,
             'performance_metrics': performance_metrics,
-            'results_df': results_df
+            'results_df': results_df,
+            'result_store': result_store
         }
         
     except Exception as e:
@@ -133,7 +182,7 @@ def run_quick_analysis():
     
     # Basit model eğitimi
     model = DoseResponseModel()
-    model.train(X, y)
+    model.train(X, y, groups=data_processor.get_groups())
     
     # Sadece 5 hücre hattı için örnek analiz
     sample_cells = data_processor.get_cell_lines()[:5]
@@ -4,55 +4,211 @@ Model eğitimi ve tahmin modülü - Paclitaxel doz optimizasyonu
 
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import KFold, GridSearchCV
+from sklearn.model_selection import KFold, GroupKFold
 from sklearn.metrics import r2_score, mean_squared_error
+from joblib import Parallel, delayed
 import xgboost as xgb
+import itertools
+import json
+import time
+
+class FlatTreeEvaluator:
+    """XGBoost ağaçlarını düz NumPy dizilerine aktarıp vektörel olarak değerlendir"""
+    
+    def __init__(self, booster):
+        feature_names = booster.feature_names or []
+        feature_index = {name: i for i, name in enumerate(feature_names)}
+        
+        # Taban skoru (reg:squarederror için çıktı = base_score + yaprak toplamı)
+        config = json.loads(booster.save_config())
+        base_score = config['learner']['learner_model_param']['base_score']
+        self.base_score = np.float32(float(base_score.strip('[]')))
+        
+        features, thresholds, lefts, rights, missings, values = [], [], [], [], [], []
+        roots = []
+        self.max_depth = 0
+        
+        for tree_json in booster.get_dump(dump_format='json'):
+            tree = json.loads(tree_json)
+            offset = len(features)
+            roots.append(offset)
+            
+            # Düğüm kimlikleri budama sonrası boşluklu olabilir
+            nodes = {}
+            stack = [(tree, 0)]
+            while stack:
+                node, depth = stack.pop()
+                nodes[node['nodeid']] = node
+                self.max_depth = max(self.max_depth, depth)
+                for child in node.get('children', []):
+                    stack.append((child, depth + 1))
+            
+            n_nodes = max(nodes) + 1
+            features.extend([0] * n_nodes)
+            thresholds.extend([0.0] * n_nodes)
+            lefts.extend([-1] * n_nodes)
+            rights.extend([-1] * n_nodes)
+            missings.extend([-1] * n_nodes)
+            values.extend([0.0] * n_nodes)
+            
+            for node_id, node in nodes.items():
+                idx = offset + node_id
+                if 'leaf' in node:
+                    values[idx] = node['leaf']
+                    # Yaprak düğümü kendine işaret eder
+                    lefts[idx] = rights[idx] = missings[idx] = idx
+                else:
+                    split = node['split']
+                    features[idx] = feature_index[split] if split in feature_index else int(split.lstrip('f'))
+                    thresholds[idx] = node['split_condition']
+                    lefts[idx] = offset + node['yes']
+                    rights[idx] = offset + node['no']
+                    missings[idx] = offset + node['missing']
+        
+        self.features = np.asarray(features, dtype=np.intp)
+        self.thresholds = np.asarray(thresholds, dtype=np.float32)
+        self.lefts = np.asarray(lefts, dtype=np.intp)
+        self.rights = np.asarray(rights, dtype=np.intp)
+        self.missings = np.asarray(missings, dtype=np.intp)
+        self.values = np.asarray(values, dtype=np.float32)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        
+    def predict(self, X):
+        """Tüm ağaçları aynı anda, derinlik boyunca adım adım değerlendir"""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        
+        for _ in range(self.max_depth):
+            x = X[rows, self.features[node]]
+            next_node = np.where(x < self.thresholds[node], self.lefts[node], self.rights[node])
+            node = np.where(np.isnan(x), self.missings[node], next_node)
+        
+        return self.base_score + self.values[node].sum(axis=1, dtype=np.float32)
 
 class DoseResponseModel:
-    def __init__(self):
+    _FAST_PATH_ATTRS = (
+        '_booster', '_flat_trees', '_scale_coef', '_scale_offset',
+        '_cell_line_codes', '_curve_templates', '_curve_buffers'
+    )
+    
+    def __init__(self, result_store=None):
         self.model = None
         self.best_params = None
+        self.result_store = result_store
+        self.cv_folds = None
+        self.cv_score = None
+        self.group_cv_folds = None
+        self.group_cv_score = None
         self.feature_names = ['dose', 'cell_line_encoded', 'log_dose']
         
-    def train(self, X, y):
-        """Modeli eğit"""
+        # Düşük gecikmeli tahmin yolu (build_fast_predictor ile hazırlanır)
+        self._booster = None
+        self._flat_trees = None
+        self._scale_coef = None
+        self._scale_offset = None
+        self._cell_line_codes = None
+        self._curve_templates = {}
+        self._curve_buffers = {}
+        
+    def build_cv_folds(self, X, groups=None, n_splits=5):
+        """
+        Cross-validation fold indekslerini bir kez hesapla
+        groups verilirse (ör. ARXSPAN_ID) GroupKFold kullanılır; böylece aynı
+        hücre hattının tekrarları eğitim ve test katlarına bölünmez
+        """
+        if groups is not None:
+            splits = GroupKFold(n_splits=n_splits).split(X, groups=groups)
+        else:
+            splits = KFold(n_splits=n_splits, shuffle=True, random_state=42).split(X)
+        
+        return [(train_idx, test_idx) for train_idx, test_idx in splits]
+        
+    def train(self, X, y, n_jobs=-1, groups=None, max_rounds=300, early_stopping_rounds=10):
+        """
+        Modeli eğit
+        n_jobs: grid search için kullanılacak çekirdek sayısı (-1 = tümü)
+        groups: hücre hattı kimlikleri (ARXSPAN_ID); verilirse seçilen yapılandırma
+        ayrıca GroupKFold ile değerlendirilir ve group_cv_score olarak raporlanır
+        Adaylar satır bazlı katlarda xgb.cv ile erken durdurmalı değerlendirilir;
+        seçilen tur sayısı best_params['n_estimators'] olarak kaydedilir.
+        Seçim bilerek GroupKFold ile yapılmaz: hücre hattına özgü tek girdi olan
+        cell_line_encoded görülmemiş hatlara taşınamaz, bu yüzden grup bazlı seçim
+        hücre hattını yok sayan modelleri ödüllendirir ve hat başına eğrileri düzleştirir
+        """
         print("Model eğitimi başlıyor...")
         
-        # XGBoost model parametreleri
+        # XGBoost model parametreleri (adaylar tek iş parçacığında, paralellik aday düzeyinde)
         xgb_params = {
             'objective': 'reg:squarederror',
-            'random_state': 42,
-            'n_jobs': -1
+            'seed': 42,
+            'nthread': 1
         }
         
-        # Hyperparameter grid
+        # Hyperparameter grid (tur sayısı erken durdurma ile belirlenir)
         param_grid = {
             'max_depth': [3, 5, 7],
             'learning_rate': [0.01, 0.1, 0.2],
-            'n_estimators': [100, 200, 300],
             'min_child_weight': [1, 3, 5],
             'subsample': [0.8, 0.9, 1.0],
             'colsample_bytree': [0.8, 0.9, 1.0]
         }
-        
-        # Model oluştur
-        model = xgb.XGBRegressor(**xgb_params)
-        
-        # Cross-validation ile grid search
-        kf = KFold(n_splits=5, shuffle=True, random_state=42)
-        grid_search = GridSearchCV(
-            estimator=model,
-            param_grid=param_grid,
-            cv=kf,
-            scoring='r2',
-            n_jobs=-1,
-            verbose=1
+        candidates = [dict(zip(param_grid, values)) for values in itertools.product(*param_grid.values())]
+        
+        # Fold indeksleri ve DMatrix tüm adaylar için bir kez hazırlanır
+        folds = self.cv_folds = self.build_cv_folds(X)
+        self.group_cv_folds = self.build_cv_folds(X, groups) if groups is not None else None
+        dtrain = xgb.DMatrix(X, label=y)
+        
+        def evaluate(params):
+            cv_results = xgb.cv(
+                {**xgb_params, **params},
+                dtrain,
+                num_boost_round=max_rounds,
+                folds=folds,
+                metrics='rmse',
+                early_stopping_rounds=early_stopping_rounds
+            )
+            # Erken durdurmada sonuçlar en iyi tura kadar kesilir
+            return cv_results['test-rmse-mean'].iloc[-1], len(cv_results)
+        
+        print(f"{len(folds)} katta {len(candidates)} aday değerlendiriliyor (KFold)...")
+        scores = Parallel(n_jobs=n_jobs, prefer='threads', verbose=1)(
+            delayed(evaluate)(params) for params in candidates
         )
         
-        grid_search.fit(X, y)
-        
-        self.model = grid_search.best_estimator_
-        self.best_params = grid_search.best_params_
+        best_idx = int(np.argmin([rmse for rmse, _ in scores]))
+        best_cv_rmse, best_rounds = scores[best_idx]
+        self.best_params = {**candidates[best_idx], 'n_estimators': best_rounds}
+        
+        # Seçilen yapılandırmanın katlar dışı (out-of-fold) R² skoru
+        def out_of_fold_r2(eval_folds):
+            oof_pred = np.empty(len(y))
+            for train_idx, test_idx in eval_folds:
+                booster = xgb.train(
+                    {**xgb_params, **candidates[best_idx]},
+                    dtrain.slice(train_idx),
+                    num_boost_round=best_rounds
+                )
+                oof_pred[test_idx] = booster.predict(dtrain.slice(test_idx))
+            return r2_score(y, oof_pred)
+        
+        self.cv_score = out_of_fold_r2(folds)
+        
+        # Görülmemiş hücre hatları için dürüst skor (yalnızca raporlanır, seçimde kullanılmaz)
+        self.group_cv_score = None
+        if self.group_cv_folds is not None:
+            self.group_cv_score = out_of_fold_r2(self.group_cv_folds)
+        
+        # Son modeli tüm veriyle eğit
+        self.model = xgb.XGBRegressor(
+            objective='reg:squarederror',
+            random_state=42,
+            n_jobs=n_jobs,
+            **self.best_params
+        )
+        self.model.fit(X, y)
+        self._reset_fast_predictor()
         
         # Model performansını değerlendir
         y_pred = self.model.predict(X)
@@ -60,11 +216,20 @@ class DoseResponseModel:
         rmse = np.sqrt(mean_squared_error(y, y_pred))
         
         print(f"Model eğitimi tamamlandı!")
-        print(f"En iyi R² skoru: {grid_search.best_score_:.3f}")
+        print(f"CV R² skoru (katlar dışı): {self.cv_score:.3f}")
+        if self.group_cv_score is not None:
+            print(f"Grup bazlı CV R² skoru (görülmemiş hücre hatları): {self.group_cv_score:.3f}")
+        print(f"CV RMSE: {best_cv_rmse:.3f}")
         print(f"Eğitim R² skoru: {r2:.3f}")
         print(f"Eğitim RMSE: {rmse:.3f}")
         print(f"En iyi parametreler: {self.best_params}")
         
+        if self.result_store is not None:
+            self.result_store.write_feature_importance(self.get_feature_importance())
+            self.result_store.update_run_metadata(
+                best_params=self.best_params, cv_r2=self.cv_score, group_cv_r2=self.group_cv_score
+            )
+        
         return self
         
     def predict(self, X):
@@ -157,6 +322,10 @@ class DoseResponseModel:
         if self.model is None:
             raise ValueError("Model eğitilmedi. train() fonksiyonunu çağırın.")
         
+        # Hızlı yol hazırlandıysa onu kullan
+        if self._booster is not None:
+            return self.predict_dose_response_curve_fast(cell_line, n_points)
+        
         # Doz aralığı
         dose_range = np.logspace(np.log10(0.0004), np.log10(0.1024), n_points)
         
@@ -181,4 +350,129 @@ class DoseResponseModel:
         # Tahminleri yap
         predicted_viability = self.predict(X_pred)
         
-        return dose_range, predicted_viability 
\ No newline at end of file
+        return dose_range, predicted_viability
+        
+    def _reset_fast_predictor(self):
+        """Hızlı tahmin önbelleğini temizle (model değiştiğinde)"""
+        self._booster = None
+        self._flat_trees = None
+        self._scale_coef = None
+        self._scale_offset = None
+        self._cell_line_codes = None
+        self._curve_templates = {}
+        self._curve_buffers = {}
+        
+    def build_fast_predictor(self, data_processor, use_flat_trees=False):
+        """
+        Tekil sorgular için düşük gecikmeli tahmin yolunu hazırla
+        use_flat_trees: True ise ağaçlar düz NumPy dizilerine aktarılır ve
+        XGBoost yerine vektörel değerlendirici kullanılır
+        """
+        if self.model is None:
+            raise ValueError("Model eğitilmedi. train() fonksiyonunu çağırın.")
+        
+        self._reset_fast_predictor()
+        
+        # StandardScaler: (x - mean) / scale  ->  x * coef + offset
+        self._scale_coef = 1.0 / data_processor.scaler.scale_
+        self._scale_offset = -data_processor.scaler.mean_ * self._scale_coef
+        
+        # LabelEncoder.transform yerine sözlük araması
+        self._cell_line_codes = {
+            cell_line: code for code, cell_line in enumerate(data_processor.label_encoder.classes_)
+        }
+        
+        self._booster = self.model.get_booster()
+        if use_flat_trees:
+            self._flat_trees = FlatTreeEvaluator(self._booster)
+        
+        return self
+        
+    def _get_curve_template(self, n_points):
+        """n_points için doz aralığı ve ölçeklenmiş özellik şablonunu önbellekten al"""
+        if n_points not in self._curve_templates:
+            dose_range = np.logspace(np.log10(0.0004), np.log10(0.1024), n_points)
+            log_doses = np.log10(dose_range + 1e-10)
+            
+            template = np.empty((n_points, 3), dtype=np.float32)
+            template[:, 0] = dose_range * self._scale_coef[0] + self._scale_offset[0]
+            template[:, 1] = 0.0
+            template[:, 2] = log_doses * self._scale_coef[1] + self._scale_offset[1]
+            
+            self._curve_templates[n_points] = (dose_range, template)
+            self._curve_buffers[n_points] = template.copy()
+        
+        return self._curve_templates[n_points][0], self._curve_buffers[n_points]
+        
+    def predict_dose_response_curve_fast(self, cell_line, n_points=100):
+        """Önceden hazırlanmış şablon ve tampon ile doz-yanıt eğrisi tahmin et"""
+        if self._booster is None:
+            raise ValueError("Hızlı tahmin yolu hazır değil. build_fast_predictor() çağırın.")
+        
+        cell_line_encoded = self._cell_line_codes.get(cell_line)
+        if cell_line_encoded is None:
+            return None, None
+        
+        dose_range, buffer = self._get_curve_template(n_points)
+        buffer[:, 1] = cell_line_encoded
+        
+        if self._flat_trees is not None:
+            predicted_viability = self._flat_trees.predict(buffer)
+        else:
+            predicted_viability = self._booster.inplace_predict(buffer, validate_features=False)
+        
+        return dose_range, predicted_viability
+        
+    def benchmark_prediction_latency(self, data_processor, cell_lines=None, n_points=100, n_repeats=200):
+        """Standart ve hızlı tahmin yolları için sorgu başına p50/p99 gecikmeyi ölç"""
+        if self.model is None:
+            raise ValueError("Model eğitilmedi. train() fonksiyonunu çağırın.")
+        
+        if cell_lines is None:
+            cell_lines = data_processor.get_cell_lines()[:10]
+        
+        def measure(predict_fn):
+            # Şablon önbelleğinin ilk kurulumu ölçüme girmesin
+            predict_fn(cell_lines[0])
+            latencies = []
+            for i in range(n_repeats):
+                cell_line = cell_lines[i % len(cell_lines)]
+                start = time.perf_counter()
+                predict_fn(cell_line)
+                latencies.append(time.perf_counter() - start)
+            return np.asarray(latencies) * 1e6  # µs
+        
+        # Mevcut hızlı tahmin kurulumunu sakla (ölçüm sonunda geri yüklenir)
+        fast_path_state = {name: getattr(self, name) for name in self._FAST_PATH_ATTRS}
+        
+        # Önbelleği kaldırarak standart yolu ölç
+        self._reset_fast_predictor()
+        paths = {'standard': measure(
+            lambda cl: self.predict_dose_response_curve(data_processor, cl, n_points)
+        )}
+        
+        self.build_fast_predictor(data_processor)
+        paths['inplace_predict'] = measure(
+            lambda cl: self.predict_dose_response_curve_fast(cl, n_points)
+        )
+        
+        self.build_fast_predictor(data_processor, use_flat_trees=True)
+        paths['flat_trees'] = measure(
+            lambda cl: self.predict_dose_response_curve_fast(cl, n_points)
+        )
+        
+        # Önceki kurulumu geri yükle
+        for name, value in fast_path_state.items():
+            setattr(self, name, value)
+        
+        benchmark_df = pd.DataFrame([{
+            'Path': name,
+            'p50_µs': np.percentile(latencies, 50),
+            'p99_µs': np.percentile(latencies, 99),
+            'Mean_µs': latencies.mean()
+        } for name, latencies in paths.items()])
+        
+        print(f"\nTahmin gecikmesi ({n_points} doz noktası, {n_repeats} sorgu):")
+        print(benchmark_df.to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+        
+        return benchmark_df 
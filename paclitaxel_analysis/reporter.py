@@ -8,9 +8,10 @@ from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
 from datetime import datetime
 
 class Reporter:
-    def __init__(self):
+    def __init__(self, result_store=None):
         self.optimal_dose_results = []
         self.performance_metrics = {}
+        self.result_store = result_store
         
     def calculate_model_performance(self, y_true, y_pred):
         """Model performans metriklerini hesapla"""
@@ -26,6 +27,9 @@ class Reporter:
             'Analysis_Date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
+        if self.result_store is not None:
+            self.result_store.update_run_metadata(performance_metrics=self.performance_metrics)
+        
         return self.performance_metrics
         
     def add_optimal_dose(self, cell_line, optimal_dose, ci_lower, ci_upper, predicted_viability=None):
@@ -71,6 +75,10 @@ class Reporter:
             results_df.to_csv('paclitaxel_optimal_doses.csv', index=False)
             print(f"\n💾 Sonuçlar 'paclitaxel_optimal_doses.csv' dosyasına kaydedildi.")
             
+            if self.result_store is not None:
+                self.result_store.write_line_results('optimal_dose', results_df)
+                print(f"💾 Sonuçlar '{self.result_store.db_path}' deposuna yazıldı (run_id: {self.result_store.run_id}).")
+            
             return results_df
         
         return None 
\ No newline at end of file
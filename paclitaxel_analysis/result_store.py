@@ -0,0 +1,203 @@
+"""
+Sonuç deposu modülü - Paclitaxel doz optimizasyonu
+"""
+
+import json
+import sqlite3
+import uuid
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+class ResultStore:
+    """
+    Çalıştırmalar arası sonuçlar için yerel SQLite deposu
+    Hücre hattı sonuçları (çalıştırma, ilaç, tür, hücre hattı, metrik) anahtarıyla
+    uzun formatta saklanır; eksik (NaN) değerler yazılmaz
+    """
+    
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS runs (
+        run_id TEXT PRIMARY KEY,
+        drug TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        metadata TEXT
+    );
+    CREATE TABLE IF NOT EXISTS line_results (
+        run_id TEXT NOT NULL REFERENCES runs(run_id),
+        drug TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        cell_line TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        value,
+        PRIMARY KEY (run_id, drug, kind, cell_line, metric)
+    );
+    CREATE INDEX IF NOT EXISTS idx_line_results_history
+        ON line_results (drug, cell_line, kind, metric);
+    CREATE TABLE IF NOT EXISTS feature_importance (
+        run_id TEXT NOT NULL REFERENCES runs(run_id),
+        drug TEXT NOT NULL,
+        feature TEXT NOT NULL,
+        importance REAL,
+        PRIMARY KEY (run_id, drug, feature)
+    );
+    CREATE INDEX IF NOT EXISTS idx_runs_drug_created ON runs (drug, created_at);
+    """
+    
+    def __init__(self, db_path='paclitaxel_results.db', run_id=None, drug='PACLITAXEL'):
+        self.db_path = db_path
+        self.run_id = run_id
+        self.drug = drug
+        self._conn = None
+        
+    def __getstate__(self):
+        # Bağlantı süreçler arasında taşınamaz; alt süreç kendi bağlantısını açar
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        return state
+        
+    @property
+    def conn(self):
+        """Süreç başına tembel açılan SQLite bağlantısı"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+        
+    def close(self):
+        """Bağlantıyı kapat"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        
+    def start_run(self, drug=None, metadata=None):
+        """Yeni çalıştırma kaydı oluştur ve run_id döndür"""
+        if drug is not None:
+            self.drug = drug
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO runs (run_id, drug, created_at, metadata) VALUES (?, ?, ?, ?)',
+                (self.run_id, self.drug, created_at, json.dumps(metadata or {}, default=str))
+            )
+        return self.run_id
+        
+    def update_run_metadata(self, **metadata):
+        """Çalıştırma meta verisine anahtar ekle (ör. model performansı)"""
+        self._require_run()
+        with self.conn:
+            # Okuma-değiştirme-yazma tek yazma işleminde; eşzamanlı süreçler güncelleme kaybetmez
+            self.conn.execute('BEGIN IMMEDIATE')
+            row = self.conn.execute('SELECT metadata FROM runs WHERE run_id = ?', (self.run_id,)).fetchone()
+            current = json.loads(row[0]) if row and row[0] else {}
+            current.update(metadata)
+            self.conn.execute(
+                'UPDATE runs SET metadata = ? WHERE run_id = ?',
+                (json.dumps(current, default=str), self.run_id)
+            )
+        
+    def _require_run(self):
+        if self.run_id is None:
+            raise ValueError("Aktif çalıştırma yok. Önce start_run() çağırın.")
+        
+    @staticmethod
+    def _to_sql_value(value):
+        """NumPy skalerlerini SQLite tiplerine dönüştür; eksik değerler için None"""
+        if value is None:
+            return None
+        if isinstance(value, (np.bool_, bool)):
+            return int(value)
+        if isinstance(value, (np.integer, int)):
+            return int(value)
+        if isinstance(value, (np.floating, float)):
+            return None if np.isnan(value) else float(value)
+        return str(value)
+        
+    def write_line_results(self, kind, results_df, cell_line_column='Cell_Line', drug=None):
+        """
+        Hücre hattı başına sonuç tablosunu tek işlemde toplu yaz
+        kind: sonuç türü ('ic50', 'response', 'optimal_dose' ...)
+        """
+        self._require_run()
+        drug = drug or self.drug
+        
+        long_df = results_df.melt(id_vars=cell_line_column, var_name='metric', value_name='value')
+        rows = [
+            (self.run_id, drug, kind, str(cell_line), metric, value)
+            for cell_line, metric, value in zip(
+                long_df[cell_line_column], long_df['metric'], map(self._to_sql_value, long_df['value'])
+            )
+            if value is not None
+        ]
+        
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO line_results (run_id, drug, kind, cell_line, metric, value) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+        return len(rows)
+        
+    def write_feature_importance(self, importance_df, drug=None):
+        """Özellik önemlerini tek işlemde yaz"""
+        self._require_run()
+        drug = drug or self.drug
+        
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO feature_importance (run_id, drug, feature, importance) '
+                'VALUES (?, ?, ?, ?)',
+                [
+                    (self.run_id, drug, feature, self._to_sql_value(importance))
+                    for feature, importance in zip(importance_df['Feature'], importance_df['Importance'])
+                ]
+            )
+        
+    def list_runs(self, drug=None, last_n=None):
+        """Çalıştırmaları yeniden eskiye listele"""
+        query = 'SELECT run_id, drug, created_at, metadata FROM runs'
+        params = []
+        if drug is not None:
+            query += ' WHERE drug = ?'
+            params.append(drug)
+        query += ' ORDER BY created_at DESC, rowid DESC'
+        if last_n is not None:
+            query += ' LIMIT ?'
+            params.append(last_n)
+        
+        return pd.read_sql_query(query, self.conn, params=params)
+        
+    def get_line_history(self, cell_line, metric='IC50_µM', kind='ic50', drug=None, last_n_runs=10):
+        """Bir hücre hattının metriğini son N çalıştırma boyunca getir (indeksli sorgu)"""
+        return pd.read_sql_query(
+            '''
+            SELECT l.run_id, r.created_at, l.value
+            FROM line_results AS l JOIN runs AS r ON r.run_id = l.run_id
+            WHERE l.drug = ? AND l.cell_line = ? AND l.kind = ? AND l.metric = ?
+            ORDER BY r.created_at DESC, r.rowid DESC
+            LIMIT ?
+            ''',
+            self.conn,
+            params=[drug or self.drug, cell_line, kind, metric, last_n_runs]
+        )
+        
+    def load_line_results(self, kind, run_id=None, drug=None):
+        """Bir çalıştırmanın sonuç türünü geniş tablo olarak yükle (varsayılan: aktif çalıştırma)"""
+        run_id = run_id or self.run_id
+        if run_id is None:
+            raise ValueError("run_id belirtilmedi ve aktif çalıştırma yok.")
+        
+        long_df = pd.read_sql_query(
+            'SELECT cell_line, metric, value FROM line_results WHERE run_id = ? AND drug = ? AND kind = ?',
+            self.conn,
+            params=[run_id, drug or self.drug, kind]
+        )
+        if long_df.empty:
+            return long_df
+        
+        wide_df = long_df.pivot(index='cell_line', columns='metric', values='value')
+        wide_df.columns.name = None
+        return wide_df.reset_index().rename(columns={'cell_line': 'Cell_Line'}) 
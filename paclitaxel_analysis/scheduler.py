@@ -0,0 +1,150 @@
+"""
+Aşama zamanlayıcısı modülü - Paclitaxel doz optimizasyonu
+"""
+
+import os
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+def _run_stage(func, args, kwargs):
+    """Aşamayı alt süreçte çalıştır ve zaman damgalarını kaydet"""
+    start = time.time()
+    result = func(*args, **kwargs)
+    return result, start, time.time(), os.getpid()
+
+class StageScheduler:
+    def __init__(self, max_cores=None):
+        self.max_cores = max_cores or os.cpu_count() or 1
+        self.stages = {}
+        self.timeline = []
+        
+    def add_stage(self, name, func, args=(), deps=(), cores=1):
+        """
+        Aşama ekle
+        func: modül düzeyinde (pickle edilebilir) fonksiyon; bağımlılıkların
+        sonuçları aşama adlarıyla anahtar kelime argümanı olarak verilir
+        cores: aşamanın genel çekirdek bütçesinden ayırdığı çekirdek sayısı
+        """
+        if name in self.stages:
+            raise ValueError(f"Aşama zaten tanımlı: {name}")
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"'{name}' aşamasının bağımlılığı tanımlı değil: {dep}")
+        
+        self.stages[name] = {
+            'func': func,
+            'args': tuple(args),
+            'deps': tuple(deps),
+            'cores': max(1, min(cores, self.max_cores))
+        }
+        return self
+        
+    def run(self):
+        """Bağımlılıkları hazır olan aşamaları çekirdek bütçesi içinde eşzamanlı çalıştır"""
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+        free_cores = self.max_cores
+        self.timeline = []
+        
+        executor = ProcessPoolExecutor(max_workers=self.max_cores)
+        try:
+            while pending or running:
+                # Hazır aşamaları tanımlanma sırasıyla başlat
+                for name, stage in list(pending.items()):
+                    ready = all(dep in results for dep in stage['deps'])
+                    if ready and stage['cores'] <= free_cores:
+                        kwargs = {dep: results[dep] for dep in stage['deps']}
+                        future = executor.submit(_run_stage, stage['func'], stage['args'], kwargs)
+                        running[future] = name
+                        free_cores -= stage['cores']
+                        del pending[name]
+                        print(f"   ▶ {name} başladı ({stage['cores']} çekirdek)")
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    free_cores += self.stages[name]['cores']
+                    
+                    try:
+                        result, start, end, pid = future.result()
+                    except Exception as e:
+                        raise RuntimeError(f"'{name}' aşaması başarısız: {str(e)}") from e
+                    
+                    results[name] = result
+                    self.timeline.append({
+                        'Stage': name,
+                        'Start': start,
+                        'End': end,
+                        'Cores': self.stages[name]['cores'],
+                        'PID': pid
+                    })
+                    print(f"   ✓ {name} tamamlandı ({end - start:.1f} sn)")
+        except BaseException:
+            # Hata kardeş aşamaların bitmesini beklemeden bildirilsin
+            self._terminate(executor)
+            raise
+        
+        executor.shutdown(wait=True)
+        return results
+        
+    @staticmethod
+    def _terminate(executor):
+        """Havuzu beklemeden kapat; çalışan aşamalar cancel() ile durmadığı için süreçleri sonlandır"""
+        processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        
+    def get_critical_path(self):
+        """Bağımlılık zinciri boyunca en uzun süreli aşama yolunu döndür"""
+        durations = {row['Stage']: row['End'] - row['Start'] for row in self.timeline}
+        
+        # Aşamalar tanımlanma sırasında topolojik olarak sıralıdır
+        path_length, previous = {}, {}
+        for name, stage in self.stages.items():
+            if name not in durations:
+                continue
+            best_dep = max(stage['deps'], key=lambda dep: path_length.get(dep, 0), default=None)
+            previous[name] = best_dep
+            path_length[name] = durations[name] + path_length.get(best_dep, 0)
+        
+        if not path_length:
+            return [], 0.0
+        
+        name = max(path_length, key=path_length.get)
+        total = path_length[name]
+        path = []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        
+        return path[::-1], total
+        
+    def export_timeline(self, file_path='pipeline_stage_timeline.csv'):
+        """Aşama zaman çizelgesini kritik yol işaretiyle CSV olarak kaydet"""
+        if not self.timeline:
+            raise ValueError("Zaman çizelgesi boş. Önce run() çağırın.")
+        
+        critical_path, critical_time = self.get_critical_path()
+        t0 = min(row['Start'] for row in self.timeline)
+        
+        timeline_df = pd.DataFrame([{
+            'Stage': row['Stage'],
+            'Depends_On': ','.join(self.stages[row['Stage']]['deps']),
+            'Cores': row['Cores'],
+            'PID': row['PID'],
+            'Start_s': row['Start'] - t0,
+            'End_s': row['End'] - t0,
+            'Duration_s': row['End'] - row['Start'],
+            'On_Critical_Path': row['Stage'] in critical_path
+        } for row in self.timeline]).sort_values('Start_s')
+        
+        timeline_df.to_csv(file_path, index=False)
+        wall_time = timeline_df['End_s'].max()
+        print(f"\nAşama zaman çizelgesi kaydedildi: {file_path}")
+        print(f"- Toplam süre: {wall_time:.1f} sn, kritik yol ({critical_time:.1f} sn): {' → '.join(critical_path)}")
+        
+        return timeline_df 